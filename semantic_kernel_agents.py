@@ -2,78 +2,287 @@
 
 """Side-by-side sequential orchestrations for Agent Framework and Semantic Kernel."""
 
+from __future__ import annotations
+
 import asyncio
+import functools
+import hashlib
+import importlib.util
+import json
 from collections.abc import Sequence
-from typing import cast
+from typing import TYPE_CHECKING, cast
 import os
+import sys
 
-from azure.identity import AzureCliCredential
-from semantic_kernel.agents import Agent, ChatCompletionAgent, SequentialOrchestration
-from semantic_kernel.agents.runtime import InProcessRuntime
-from semantic_kernel.connectors.ai.open_ai import OpenAIChatCompletion 
-from semantic_kernel.contents import ChatMessageContent
-
-from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
+# The SDKs below pull in hundreds of modules, so they are imported where they
+# are first used rather than at module load.
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from openai.types import Batch
+    from semantic_kernel.agents import Agent
+    from semantic_kernel.connectors.ai.open_ai import OpenAIChatCompletion
+    from semantic_kernel.contents import ChatMessageContent
+
 load_dotenv()
 
 PROMPT = "Write a tagline for a budget-friendly eBike."
 
-openai_client = AsyncOpenAI(
-    base_url = "https://models.github.ai/inference",
-    api_key = os.environ["GITHUB_TOKEN"],
-    default_query = {
-        "api-version": "2024-08-01-preview",
-    },
-)
+# Kept as constants, free of templating, so every request sends a
+# byte-identical system prefix.
+WRITER_INSTRUCTIONS = "You are a concise copywriter. Provide a single, punchy marketing sentence based on the prompt."
+REVIEWER_INSTRUCTIONS = "You are a thoughtful reviewer. Give brief feedback on the previous assistant message."
+
+MODEL_ID = "openai/gpt-4.1"
+
+# GitHub Models has no Files or Batches endpoints, so the batch path talks to
+# OpenAI directly and needs an OpenAI model name.
+BATCH_MODEL_ID = "gpt-4.1"
+
+
+# HTTP/2 lets concurrent runs (run_semantic_kernel_many) share one
+# connection; httpx needs the optional h2 package for it.
+HTTP2_ENABLED = importlib.util.find_spec("h2") is not None
+
+
+@functools.lru_cache(maxsize=1)
+def create_openai_client() -> AsyncOpenAI:
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    # Built once so every run reuses the same httpx connection pool. The pool
+    # belongs to the event loop that first used it; see close_clients().
+    return AsyncOpenAI(
+        base_url = "https://models.github.ai/inference",
+        api_key = os.environ["GITHUB_TOKEN"],
+        default_query = {
+            "api-version": "2024-08-01-preview",
+        },
+        http_client = DefaultAsyncHttpxClient(http2=HTTP2_ENABLED),
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def create_batch_client() -> AsyncOpenAI:
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
 
-chat_client = OpenAIChatCompletion(
-        async_client=openai_client,
-        ai_model_id="openai/gpt-4.1",
+
+@functools.lru_cache(maxsize=1)
+def create_chat_client() -> OpenAIChatCompletion:
+    from semantic_kernel.connectors.ai.open_ai import OpenAIChatCompletion
+
+    return OpenAIChatCompletion(
+        async_client=create_openai_client(),
+        ai_model_id=MODEL_ID,
     )
 
+
+async def close_clients() -> None:
+    """Close the shared OpenAI clients, if they were created.
+
+    The cached client's connections are bound to the running event loop.
+    Callers that drive the ``run_*`` helpers with their own ``asyncio.run``
+    must await this before that loop ends, otherwise the next loop reuses
+    dead connections and fails with "Event loop is closed".
+    """
+    if create_openai_client.cache_info().currsize:
+        await create_openai_client().close()
+        create_openai_client.cache_clear()
+        create_chat_client.cache_clear()
+        _get_semantic_kernel_agents.cache_clear()
+    if create_batch_client.cache_info().currsize:
+        await create_batch_client().close()
+        create_batch_client.cache_clear()
+
+# Final orchestration output and transcript per prompt, persisted so later
+# runs of the same prompt skip the model entirely. Delete the directory to
+# clear it.
+RESULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".agent_cache")
+_RESULT_CACHE_PATH = os.path.join(RESULT_CACHE_DIR, "results.json")
+_RESULT_CACHE: dict[str, dict] | None = None
+
+
+def _prompt_cache_key(prompt: str) -> str:
+    # Whitespace is normalized but case is kept: "US" and "us" are different
+    # prompts. Model and instructions are part of the key so editing them
+    # does not serve answers produced under the old setup.
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (MODEL_ID, WRITER_INSTRUCTIONS, REVIEWER_INSTRUCTIONS, " ".join(prompt.split())):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _result_cache() -> dict[str, dict]:
+    global _RESULT_CACHE
+    if _RESULT_CACHE is None:
+        try:
+            with open(_RESULT_CACHE_PATH, encoding="utf-8") as cache_file:
+                _RESULT_CACHE = json.load(cache_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            _RESULT_CACHE = {}
+    return _RESULT_CACHE
+
+
+def _store_result(key: str, transcript: list[list[str]], result: str) -> None:
+    cache = _result_cache()
+    cache[key] = {"transcript": transcript, "result": result}
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    # Write-then-rename so an interrupted run never leaves a truncated file.
+    temp_path = _RESULT_CACHE_PATH + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as cache_file:
+        json.dump(cache, cache_file, ensure_ascii=False, indent=2)
+    os.replace(temp_path, _RESULT_CACHE_PATH)
+
+
+# Reviewer output keyed by a digest of the writer text it reviewed. The
+# reviewer only ever sees that text, so identical writer output can reuse it.
+_REVIEW_CACHE: dict[str, str] = {}
+
+
+def _review_cache_key(instructions: str, writer_text: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(instructions.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(writer_text.encode("utf-8"))
+    return digest.hexdigest()
+
+
 ######################################################################
 # Semantic Kernel orchestration path
 ######################################################################
 
 
 def build_semantic_kernel_agents() -> list[Agent]:
-    credential = AzureCliCredential()
+    from semantic_kernel.agents import ChatCompletionAgent
 
     writer_agent = ChatCompletionAgent(
         name="WriterAgent",
-        instructions=("You are a concise copywriter. Provide a single, punchy marketing sentence based on the prompt."),
-        service=chat_client,
+        instructions=WRITER_INSTRUCTIONS,
+        service=create_chat_client(),
     )
 
-    reviewer_agent = ChatCompletionAgent(
+    reviewer_agent = _cached_reviewer_agent_type()(
         name="ReviewerAgent",
-        instructions=("You are a thoughtful reviewer. Give brief feedback on the previous assistant message."),
-        service=chat_client,
+        instructions=REVIEWER_INSTRUCTIONS,
+        service=create_chat_client(),
     )
 
     return [writer_agent, reviewer_agent]
 
 
-async def sk_agent_response_callback(
+@functools.lru_cache(maxsize=1)
+def _cached_reviewer_agent_type() -> type[Agent]:
+    """Return a ChatCompletionAgent subclass that answers from _REVIEW_CACHE.
+
+    The class is built on first use so Semantic Kernel stays a lazy import.
+    """
+    from semantic_kernel.agents import AgentResponseItem, ChatCompletionAgent, ChatHistoryAgentThread
+    from semantic_kernel.contents import AuthorRole, ChatMessageContent
+
+    class CachedReviewerAgent(ChatCompletionAgent):
+        """Reviewer that skips the model call when this writer text was already reviewed."""
+
+        def _cached_response(self, args: tuple, kwargs: dict) -> tuple[str, AgentResponseItem | None]:
+            messages = kwargs.get("messages", args[0] if args else None)
+            if isinstance(messages, list):
+                messages = messages[-1] if messages else None
+            writer_text = messages if isinstance(messages, str) else getattr(messages, "content", None) or ""
+            key = _review_cache_key(self.instructions or "", writer_text)
+            review = _REVIEW_CACHE.get(key)
+            if review is None:
+                return key, None
+            message = ChatMessageContent(role=AuthorRole.ASSISTANT, name=self.name, content=review)
+            return key, AgentResponseItem(message=message, thread=kwargs.get("thread") or ChatHistoryAgentThread())
+
+        async def get_response(self, *args, **kwargs):
+            key, cached = self._cached_response(args, kwargs)
+            if cached is not None:
+                return cached
+            response = await super().get_response(*args, **kwargs)
+            _REVIEW_CACHE[key] = response.message.content or ""
+            return response
+
+        async def invoke(self, *args, **kwargs):
+            # The orchestration's agent actors may drive either entry point.
+            key, cached = self._cached_response(args, kwargs)
+            if cached is not None:
+                yield cached
+                return
+            last = None
+            async for response in super().invoke(*args, **kwargs):
+                last = response
+                yield response
+            if last is not None:
+                _REVIEW_CACHE[key] = last.message.content or ""
+
+    return CachedReviewerAgent
+
+
+@functools.lru_cache(maxsize=1)
+def _get_semantic_kernel_agents() -> tuple[Agent, ...]:
+    return tuple(build_semantic_kernel_agents())
+
+
+def _transcript_entries(
     message: ChatMessageContent | Sequence[ChatMessageContent],
-) -> None:
+) -> list[list[str]]:
+    from semantic_kernel.contents import ChatMessageContent
+
     if isinstance(message, ChatMessageContent):
         messages: Sequence[ChatMessageContent] = [message]
     elif isinstance(message, Sequence) and not isinstance(message, (str, bytes)):
-        messages = list(message)
+        messages = message
     else:
         messages = [cast(ChatMessageContent, message)]
+    return [[item.name or "", item.content or ""] for item in messages]
 
-    for item in messages:
-        content = item.content or ""
-        print(f"# {item.name}\n{content}\n")
 
-async def run_semantic_kernel_example(prompt: str) -> str:
+def _print_transcript(entries: Sequence[Sequence[str]]) -> None:
+    # One write per callback instead of one per message.
+    sys.stdout.write("".join(f"# {name}\n{content}\n\n" for name, content in entries))
+
+
+async def sk_agent_response_callback(
+    message: ChatMessageContent | Sequence[ChatMessageContent],
+) -> None:
+    _print_transcript(_transcript_entries(message))
+
+async def run_semantic_kernel_example(prompt: str, stream: bool = True, use_cache: bool = True) -> str:
+    """Run the writer/reviewer orchestration and return the reviewer's reply.
+
+    With ``stream=False`` intermediate agent responses are not printed, for
+    callers that only need the final text. With ``use_cache`` a result stored
+    under .agent_cache/ by an earlier run of the same prompt is returned
+    without contacting the model; a streaming run replays its transcript.
+    Pass ``use_cache=False`` to always call the agents.
+    """
+    cache_key = _prompt_cache_key(prompt)
+    if use_cache:
+        cached = _result_cache().get(cache_key)
+        if cached is not None:
+            if stream:
+                _print_transcript(cached["transcript"])
+            return cached["result"]
+
+    from semantic_kernel.agents import SequentialOrchestration
+    from semantic_kernel.agents.runtime import InProcessRuntime
+    from semantic_kernel.contents import ChatMessageContent
+
+    transcript: list[list[str]] = []
+
+    async def record_response(message: ChatMessageContent | Sequence[ChatMessageContent]) -> None:
+        entries = _transcript_entries(message)
+        transcript.extend(entries)
+        if stream:
+            _print_transcript(entries)
+
+    # The callback is skipped entirely when there is nothing to print or store.
     sequential_orchestration = SequentialOrchestration(
-        members = build_semantic_kernel_agents(),
-        agent_response_callback=sk_agent_response_callback,
+        members = list(_get_semantic_kernel_agents()),
+        agent_response_callback=record_response if stream or use_cache else None,
     )
 
     runtime = InProcessRuntime()
@@ -83,16 +292,304 @@ async def run_semantic_kernel_example(prompt: str) -> str:
         orchestration_result= await sequential_orchestration.invoke(task=prompt, runtime=runtime)
         final_message = await orchestration_result.get(timeout=20)
         if isinstance(final_message, ChatMessageContent):
-            return final_message.content or ""
-        return str(final_message)
+            final_text = final_message.content or ""
+        else:
+            final_text = str(final_message)
+        if use_cache:
+            _store_result(cache_key, transcript, final_text)
+        return final_text
     finally:
         await runtime.stop_when_idle()
 
+
+async def run_semantic_kernel_many(
+    prompts: Sequence[str], max_concurrency: int = 4, stream: bool = False, use_cache: bool = True
+) -> list[str]:
+    """Run one orchestration per prompt concurrently, preserving input order.
+
+    Streaming is off by default since concurrent runs would interleave output.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(prompt: str) -> str:
+        async with semaphore:
+            return await run_semantic_kernel_example(prompt, stream=stream, use_cache=use_cache)
+
+    return list(await asyncio.gather(*(run_one(prompt) for prompt in prompts)))
+
+######################################################################
+# OpenAI Batch API path
+######################################################################
+
+
+class BatchRequestError(RuntimeError):
+    """Returned in place of a result when one prompt's request in a batch failed."""
+
+
+def _batch_request(custom_id: str, messages: list[dict[str, str]]) -> dict:
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {"model": BATCH_MODEL_ID, "messages": messages},
+    }
+
+
+async def _read_batch_results(batch: Batch) -> tuple[dict[str, str], dict[str, str]]:
+    """Split a finished batch into reply text and failure reason per custom_id.
+
+    Requests the batch never processed (e.g. it expired) are reported as
+    failures.
+    """
+    if batch.status == "failed":
+        # The input itself was rejected; no request ran.
+        raise RuntimeError(f"Batch {batch.id} failed validation: {batch.errors}")
+
+    client = create_batch_client()
+    replies: dict[str, str] = {}
+    failures: dict[str, str] = {}
+
+    async def read_jsonl(file_id: str) -> list[dict]:
+        content = await client.files.content(file_id)
+        return [json.loads(line) for line in content.text.splitlines() if line]
+
+    # Successful requests land in the output file, failed ones in the error file.
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for record in await read_jsonl(file_id):
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                failures[record["custom_id"]] = str(record.get("error") or response.get("body"))
+            else:
+                replies[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"] or ""
+
+    for request in await read_jsonl(batch.input_file_id):
+        custom_id = request["custom_id"]
+        if custom_id not in replies and custom_id not in failures:
+            failures[custom_id] = f"no result, batch {batch.id} ended as {batch.status!r}"
+    return replies, failures
+
+
+async def _submit_chat_batch(requests: list[dict], metadata: dict[str, str]) -> str:
+    """Upload chat completion requests and start a batch; returns its id."""
+    client = create_batch_client()
+    payload = "".join(json.dumps(request) + "\n" for request in requests).encode("utf-8")
+
+    input_file = await client.files.create(file=("batch.jsonl", payload), purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+        metadata=metadata,
+    )
+    return batch.id
+
+
+def _reviewer_messages(writer_text: str) -> list[dict[str, str]]:
+    # Like SequentialOrchestration, the reviewer only receives the writer's
+    # reply, not the original prompt.
+    return [
+        {"role": "system", "content": REVIEWER_INSTRUCTIONS},
+        {"role": "user", "content": writer_text},
+    ]
+
+
+def _batch_results(
+    size: int,
+    writer_replies: dict[str, str],
+    writer_failures: dict[str, str],
+    reviewer_replies: dict[str, str],
+    reviewer_failures: dict[str, str],
+) -> list[str | BatchRequestError | None]:
+    """Combine both phases into one entry per prompt; None means not reviewed yet.
+
+    Only data stored with the batches is used, never the in-process review
+    cache, so the outcome is the same in whichever process collects it.
+    """
+    results: list[str | BatchRequestError | None] = []
+    for index in range(size):
+        writer_id, reviewer_id = f"writer-{index}", f"reviewer-{index}"
+        if writer_id not in writer_replies:
+            results.append(BatchRequestError(f"{writer_id}: {writer_failures[writer_id]}"))
+        elif reviewer_id in reviewer_replies:
+            results.append(reviewer_replies[reviewer_id])
+        elif reviewer_id in reviewer_failures:
+            results.append(BatchRequestError(f"{reviewer_id}: {reviewer_failures[reviewer_id]}"))
+        else:
+            results.append(None)
+    return results
+
+
+async def _find_reviewer_batch(writer_batch: Batch) -> str | None:
+    """Return the id of a reviewer batch already submitted for ``writer_batch``."""
+    async for candidate in create_batch_client().batches.list(limit=100):
+        # Listed newest first, and a reviewer batch is always created after
+        # its writer batch, so older entries cannot match.
+        if candidate.created_at < writer_batch.created_at:
+            break
+        if (candidate.metadata or {}).get("writer_batch_id") == writer_batch.id:
+            return candidate.id
+    return None
+
+
+async def submit_batch(prompts: Sequence[str]) -> str:
+    """Start the writer phase for ``prompts`` on the OpenAI Batch API.
+
+    Returns a batch id to hand to poll_batch(); nothing waits on the batch.
+    Requires OPENAI_API_KEY, since GitHub Models has no batch endpoints.
+    """
+    if not prompts:
+        raise ValueError("submit_batch() needs at least one prompt")
+
+    writer_requests = [
+        _batch_request(
+            f"writer-{index}",
+            [
+                {"role": "system", "content": WRITER_INSTRUCTIONS},
+                {"role": "user", "content": prompt},
+            ],
+        )
+        for index, prompt in enumerate(prompts)
+    ]
+    return await _submit_chat_batch(writer_requests, {"phase": "writer", "size": str(len(prompts))})
+
+
+async def poll_batch(batch_id: str) -> tuple[str, list[str | BatchRequestError] | None]:
+    """Advance a batch started by submit_batch() without waiting on it.
+
+    Returns ``(batch_id, None)`` while work is pending; the id changes once
+    the writer phase finishes and the reviewer phase is submitted, so keep
+    polling with the returned id. When both phases are done the second item
+    holds one entry per prompt: the reviewer text, or a BatchRequestError
+    naming the request that failed, so one bad request does not discard the
+    rest of the batch.
+
+    Polling a finished writer batch again (a retry, or another worker)
+    returns the reviewer batch submitted the first time instead of paying
+    for a second one. Two pollers racing on the very same call can still
+    both submit.
+    """
+    client = create_batch_client()
+    batch = await client.batches.retrieve(batch_id)
+    if batch.status not in ("completed", "failed", "expired", "cancelled"):
+        return batch_id, None
+
+    metadata = batch.metadata or {}
+    size = int(metadata["size"])
+    if metadata["phase"] == "writer":
+        writer_replies, writer_failures = await _read_batch_results(batch)
+        results = _batch_results(size, writer_replies, writer_failures, {}, {})
+        # Every successful writer reply is reviewed in the batch, so the
+        # final results depend only on what the batches stored.
+        reviewer_requests = [
+            _batch_request(f"reviewer-{index}", _reviewer_messages(writer_replies[f"writer-{index}"]))
+            for index, result in enumerate(results)
+            if result is None
+        ]
+        if not reviewer_requests:
+            return batch_id, cast(list[str | BatchRequestError], results)
+        existing_batch_id = await _find_reviewer_batch(batch)
+        if existing_batch_id is not None:
+            return existing_batch_id, None
+        reviewer_batch_id = await _submit_chat_batch(
+            reviewer_requests,
+            {"phase": "reviewer", "size": str(size), "writer_batch_id": batch_id},
+        )
+        return reviewer_batch_id, None
+
+    writer_batch = await client.batches.retrieve(metadata["writer_batch_id"])
+    writer_replies, writer_failures = await _read_batch_results(writer_batch)
+    reviewer_replies, reviewer_failures = await _read_batch_results(batch)
+    results = _batch_results(size, writer_replies, writer_failures, reviewer_replies, reviewer_failures)
+    return batch_id, cast(list[str | BatchRequestError], results)
+
+
+async def run_batch(prompts: Sequence[str], poll_interval: float = 30.0) -> list[str | BatchRequestError]:
+    """Submit ``prompts`` with submit_batch() and poll until both phases finish.
+
+    For offline workloads that can wait up to the 24h completion window;
+    callers that should not block use submit_batch()/poll_batch() directly.
+    """
+    if not prompts:
+        return []
+
+    batch_id = await submit_batch(prompts)
+    while True:
+        batch_id, results = await poll_batch(batch_id)
+        if results is not None:
+            return results
+        await asyncio.sleep(poll_interval)
+
+######################################################################
+# Packed multi-prompt path
+######################################################################
+
+PACKED_WRITER_INSTRUCTIONS = (
+    WRITER_INSTRUCTIONS
+    + " The user sends a JSON array of prompts. Return a JSON object"
+    ' {"results": [...]} holding one sentence string per prompt, in the same order.'
+)
+PACKED_REVIEWER_INSTRUCTIONS = (
+    "You are a thoughtful reviewer. The user sends a JSON array of marketing sentences."
+    ' Return a JSON object {"results": [...]} holding one brief feedback string per sentence, in the same order.'
+)
+
+
+async def _packed_completion(instructions: str, items: Sequence[str]) -> list[str]:
+    """Answer several inputs with a single chat request and split the replies."""
+    # A JSON array keeps item boundaries intact even when items contain newlines.
+    response = await create_openai_client().chat.completions.create(
+        model=MODEL_ID,
+        messages=[
+            {"role": "system", "content": instructions},
+            {"role": "user", "content": json.dumps(list(items))},
+        ],
+        response_format={"type": "json_object"},
+    )
+    results = json.loads(response.choices[0].message.content or "{}").get("results")
+    if (
+        not isinstance(results, list)
+        or len(results) != len(items)
+        or not all(isinstance(result, str) for result in results)
+    ):
+        raise ValueError(f"Expected {len(items)} packed result strings, got {results!r}")
+    return results
+
+
+async def run_packed(prompts: Sequence[str]) -> list[str]:
+    """Run the writer and reviewer phases with one request each for all prompts.
+
+    Useful when the requests-per-minute limit binds before the token limit.
+    """
+    if not prompts:
+        return []
+
+    taglines = await _packed_completion(PACKED_WRITER_INSTRUCTIONS, prompts)
+    reviews = [_REVIEW_CACHE.get(_review_cache_key(PACKED_REVIEWER_INSTRUCTIONS, tagline)) for tagline in taglines]
+
+    pending = [index for index, review in enumerate(reviews) if review is None]
+    if pending:
+        fresh = await _packed_completion(PACKED_REVIEWER_INSTRUCTIONS, [taglines[index] for index in pending])
+        for index, review in zip(pending, fresh):
+            reviews[index] = review
+            _REVIEW_CACHE[_review_cache_key(PACKED_REVIEWER_INSTRUCTIONS, taglines[index])] = review
+
+    return cast(list[str], reviews)
+
 async def main() -> None:
     print("===== Semantic Kernel Sequential AAwnser =====")
-    final_text = await run_semantic_kernel_example(PROMPT)
-    print(final_text)
+    try:
+        final_text = await run_semantic_kernel_example(PROMPT)
+        print(final_text)
+    finally:
+        await close_clients()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())